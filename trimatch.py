@@ -1,6 +1,6 @@
-import copy
+import pickle
 import random
-from functools import lru_cache
+import sys
 
 AI_LEVEL = 1
 AI_MAX_DEPTH = 1
@@ -10,9 +10,15 @@ MAX_GAME_DEPTH = 15
 tile_map = {'n': 1, 'k': 2, 'm': 3}
 rev_map = {v: k.upper() for k, v in tile_map.items()}
 
+# The board is a single packed int: 2 bits per cell (0=empty, 1=N, 2=K, 3=M),
+# cell index r*3+c at bit 2*(r*3+c), 18 bits total.  A board is therefore its
+# own cache key: hashing it is O(1) and applying a move never copies anything.
+def cell_value(board, r, c):
+    return (board >> (2 * (r * 3 + c))) & 3
+
 # Initialize a new game state
 def new_game(start_player=1):
-    board = [[None]*3 for _ in range(3)]
+    board = 0
     history = []          # list of (player, move_str)
     undo_stack = []       # stack of (board, history, player)
     return board, history, undo_stack, start_player, False
@@ -25,129 +31,325 @@ def print_board(board):
         row_label = 3 - r
         row_vals = []
         for c in range(3):
-            val = board[r][c]
+            val = cell_value(board, r, c)
             row_vals.append(rev_map[val] if val else ' ')
         print(f"{row_label}| {row_vals[0]} | {row_vals[1]} | {row_vals[2]} |")
         print(" +---+---+---+")
 
-# Check for win, loss, or draw
+# Mask with the low bit of every cell set; used to split a packed board
+# into per-piece occupancy bitboards.
+CELL_LSB = 0b010101010101010101
+
+# The 8 lines (3 rows, 3 cols, 2 diagonals) as masks over cell low bits
+LINE_CELLS = [(0,1,2), (3,4,5), (6,7,8),
+              (0,3,6), (1,4,7), (2,5,8),
+              (0,4,8), (2,4,6)]
+LINE_MASKS = [sum(1 << (2*i) for i in cells) for cells in LINE_CELLS]
+
+# Split a packed board into one occupancy bitboard per piece type
+def occupancies(board):
+    lo = board & CELL_LSB
+    hi = (board >> 1) & CELL_LSB
+    return lo & ~hi, hi & ~lo, lo & hi   # N (01), K (10), M (11)
+
+# The masks of the 2-4 lines through each cell
+LINES_BY_CELL = [[mask for cells, mask in zip(LINE_CELLS, LINE_MASKS) if idx in cells]
+                 for idx in range(9)]
+
+# Classify a board right after a move on cell idx.  A new win or loss can
+# only appear on a line through that cell (any other decided line would have
+# ended the game a ply earlier), so only those 2-4 lines need testing; the
+# result is exactly check_outcome(board) for any legally reached position.
+def outcome_after(board, idx):
+    occ_n, occ_k, occ_m = occupancies(board)
+    for mask in LINES_BY_CELL[idx]:
+        if ((occ_n & mask).bit_count() == 1 and
+                (occ_k & mask).bit_count() == 1 and
+                (occ_m & mask).bit_count() == 1):
+            return 'loss'
+    for mask in LINES_BY_CELL[idx]:
+        if (occ_n & mask) == mask or (occ_k & mask) == mask or (occ_m & mask) == mask:
+            return 'win'
+    if (occ_n | occ_k | occ_m) == CELL_LSB:
+        return 'draw'
+    return None
+
+# Check for win, loss, or draw.  The search classifies every child of every
+# node (for ordering as well as terminal tests), and the board space is under
+# 4^9 keys, so memoizing turns repeat classifications into one dict hit.
+# The cache is shared with the search, which fills it via the cheaper
+# line-local outcome_after below.
+OUTCOME_CACHE = {}
+
 def check_outcome(board):
-    lines = []
-    for i in range(3):
-        lines.append(board[i])
-        lines.append([board[r][i] for r in range(3)])
-    lines.append([board[i][i] for i in range(3)])
-    lines.append([board[i][2-i] for i in range(3)])
-    # Loss: any 1-2-3 line
-    for line in lines:
-        if None not in line and set(line) == {1,2,3}:
+    outcome = OUTCOME_CACHE.get(board, False)
+    if outcome is False:
+        outcome = OUTCOME_CACHE[board] = _check_outcome_full(board)
+    return outcome
+
+def _check_outcome_full(board):
+    occ_n, occ_k, occ_m = occupancies(board)
+    # Loss: any 1-2-3 line (exactly one of each piece on the line)
+    for mask in LINE_MASKS:
+        if ((occ_n & mask).bit_count() == 1 and
+                (occ_k & mask).bit_count() == 1 and
+                (occ_m & mask).bit_count() == 1):
             return 'loss'
     # Win: three identical
-    for line in lines:
-        if None not in line and line[0] == line[1] == line[2]:
+    for mask in LINE_MASKS:
+        if (occ_n & mask) == mask or (occ_k & mask) == mask or (occ_m & mask) == mask:
             return 'win'
     # Draw: full board
-    if all(board[r][c] is not None for r in range(3) for c in range(3)):
+    if (occ_n | occ_k | occ_m) == CELL_LSB:
         return 'draw'
     return None
 
-# Count how many tiles of a given type are on board
+# Count how many tiles of a given type are on board: one popcount
 def count_tile(board, val):
-    return sum(cell == val for row in board for cell in row)
+    return occupancies(board)[val - 1].bit_count()
+
+# Inside the search a move is just (cell_index, piece_value); convert to the
+# user-facing "mb2" form only at the input/output boundary.
+def move_to_str(move):
+    idx, val = move
+    r, c = divmod(idx, 3)
+    return f"{rev_map[val].lower()}{chr(ord('a') + c)}{3 - r}"
+
+# Yield (child_board, move) for every legal move, applying as we generate —
+# no move strings and no re-parsing in the search hot loop
+def gen_children(board):
+    # the three pool counts are fixed for the whole board; compute them once
+    counts = [occ.bit_count() for occ in occupancies(board)]
+    for idx in range(9):
+        cell = (board >> (2 * idx)) & 3
+        for val in (1, 2, 3):
+            if val > cell and counts[val - 1] < 3:
+                yield board ^ ((cell ^ val) << (2 * idx)), (idx, val)
 
-# Generate all legal moves given a board state
+# Generate all legal moves given a board state, as move strings
 def get_possible_moves(board):
-    moves = []
-    for r in range(3):
-        for c in range(3):
-            target = board[r][c]
-            col_char = chr(ord('a') + c)
-            row_char = str(3 - r)
-            for piece_char, val in tile_map.items():
-                if target is None:
-                    if count_tile(board, val) < 3:
-                        moves.append(f"{piece_char}{col_char}{row_char}")
-                else:
-                    if val > target and count_tile(board, val) < 3:
-                        moves.append(f"{piece_char}{col_char}{row_char}")
-    return moves
+    return [move_to_str(m) for _, m in gen_children(board)]
 
-# Apply a move to a board and return new board
+# Apply a move to a board and return the new packed board
 def apply_move(board, move_str):
     piece_char, col_char, row_char = move_str[0], move_str[1], move_str[2]
     val = tile_map[piece_char]
     c = ord(col_char) - ord('a')
     r = 3 - int(row_char)
-    new_board = [row.copy() for row in board]
-    new_board[r][c] = val
-    return new_board
-
-# Helpers to convert board to a cacheable key
-def board_to_key(board):
-    return tuple(tuple(row) for row in board)
-
-def key_to_board(key):
-    return [list(row) for row in key]
+    shift = 2 * (r * 3 + c)
+    return (board & ~(0b11 << shift)) | (val << shift)
 
-# Minimax scoring with LRU cache
-def evaluate_terminal(board_key, current_player):
-    board = key_to_board(board_key)
-    result = check_outcome(board)
-    if not result:
-        return None
-    last_player = 3 - current_player
-    if result == 'win':
-        return 1 if last_player == 1 else -1
-    if result == 'loss':
-        return -1 if last_player == 1 else 1
-    return 0  # draw
+# Transposition table for the negamax search.  The packed board is already a
+# perfect 18-bit position code, so the key is the single int (board << 1) |
+# side-to-move — no Zobrist hashing or tuple keys needed.  Entries are
+# (depth_remaining, flag, value, best_move), stored always-replace and kept
+# across searches: an entry is reusable whenever it was searched at least as
+# deep as the current probe needs, and its best move seeds the move ordering
+# on re-search.
+TT = {}
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+INF = 10_000
 
-@lru_cache(maxsize=None)
-def minimax_score(board_key, current_player, depth=0):
-    if AI_MAX_DEPTH is not None and depth >= AI_MAX_DEPTH:
-    # at max depth, fall back to a flat heuristic: 0 for “unknown/draw”
+# Fail-soft alpha-beta negamax; returns the score from the side to move's
+# perspective.  Scores decay by one per ply so earlier wins/losses are more
+# extreme, which also keeps values independent of the search root (TT-safe).
+def negamax(board, player, depth_remaining, alpha, beta):
+    outcome = check_outcome(board)
+    if outcome is not None:
+        if outcome == 'win':    # opponent just completed three-of-a-kind
+            return -MAX_GAME_DEPTH
+        if outcome == 'loss':   # opponent just formed N-K-M
+            return MAX_GAME_DEPTH
+        return 0                # draw
+    if depth_remaining <= 0:
+        # at the horizon, fall back to a flat heuristic: 0 for “unknown/draw”
         return 0
-    terminal = evaluate_terminal(board_key, current_player)
-    if terminal is not None:
-        # earlier wins/losses are more extreme
-        return terminal * (MAX_GAME_DEPTH - depth)
-    board = key_to_board(board_key)
-    moves = get_possible_moves(board)
-    if current_player == 1:
-        best = -float('inf')
-        for m in moves:
-            new_key = board_to_key(apply_move(board, m))
-            score = minimax_score(new_key, 2, depth+1)
+    key = (board << 1) | (player - 1)
+    entry = TT.get(key)
+    hash_move = None
+    if entry is not None:
+        hash_move = entry[3]
+        if entry[0] >= depth_remaining:
+            _, flag, value, _ = entry
+            if flag == TT_EXACT:
+                return value
+            if flag == TT_LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+    # Classify and order children in one pass, testing only the lines the
+    # move touches: immediate wins short-circuit the whole node, terminal
+    # losses and draws are scored exactly without recursing, and the rest
+    # sort by piece value with a center bonus so alpha-beta cuts early.
+    # (Sorting on a (-priority, order) prefix avoids a key function; this
+    # loop is the interpreter's hottest path, so keep it lean.)
+    alpha_orig = alpha
+    best = -INF
+    best_move = None
+    children = []
+    outcome_cache = OUTCOME_CACHE
+    for child, move in gen_children(board):
+        outcome = outcome_cache.get(child, False)
+        if outcome is False:
+            outcome = outcome_cache[child] = outcome_after(child, move[0])
+        if outcome is None:
+            prio = move[1] * 2 + (1 if move[0] == 4 else 0)  # cell 4 = b2
+            children.append((-prio, len(children), child, move))
+        elif outcome == 'win':
+            # the mover completes three-of-a-kind: nothing can beat this
+            value = MAX_GAME_DEPTH - 1
+            TT[key] = (MAX_GAME_DEPTH, TT_EXACT, value, move)
+            return value
+        else:
+            score = 0 if outcome == 'draw' else 1 - MAX_GAME_DEPTH
             if score > best:
                 best = score
-                if best == 1:
-                    break
-        return best
+                best_move = move
+    children.sort()
+    if hash_move is not None:
+        # try the previous best move first (hash-move heuristic)
+        for i, item in enumerate(children):
+            if item[3] == hash_move:
+                children.insert(0, children.pop(i))
+                break
+    if best > alpha:
+        alpha = best
+        if alpha >= beta:
+            TT[key] = (depth_remaining, TT_LOWER, best, best_move)
+            return best
+    recurse = negamax
+    opponent = 3 - player
+    pv = True
+    for _, _, child, m in children:
+        # Principal-variation search (the sequential shape of young-brothers-
+        # wait): the first, best-ordered child is searched with the full
+        # window; its siblings only get a null-window probe just above alpha
+        # and are re-searched on a fail-high.  Child windows are widened by
+        # one to absorb the per-ply score decay.
+        if pv:
+            score = -recurse(child, opponent, depth_remaining - 1,
+                             -beta - 1, -alpha + 1)
+            score -= (score > 0) - (score < 0)
+            pv = False
+        else:
+            score = -recurse(child, opponent, depth_remaining - 1,
+                             -alpha - 2, -alpha + 1)
+            score -= (score > 0) - (score < 0)
+            if alpha < score < beta:
+                score = -recurse(child, opponent, depth_remaining - 1,
+                                 -beta - 1, -alpha + 1)
+                score -= (score > 0) - (score < 0)
+        if score > best:
+            best = score
+            best_move = m
+        if best > alpha:
+            alpha = best
+        if alpha >= beta:
+            break
+    if best <= alpha_orig:
+        flag = TT_UPPER
+    elif best >= beta:
+        flag = TT_LOWER
     else:
-        worst = float('inf')
-        for m in moves:
-            new_key = board_to_key(apply_move(board, m))
-            score = minimax_score(new_key, 1, depth+1)
-            if score < worst:
-                worst = score
-                if worst == -1:
-                    break
-        return worst
+        flag = TT_EXACT
+    TT[key] = (depth_remaining, flag, best, best_move)
+    return best
 
-# Choose the best move for AI (player 1)
-def get_best_move(board, history):
-    if not history:
-        return random.choice(get_possible_moves(board))
-    best = -float('inf')
+# Score a position from Player 1's perspective with current_player to move.
+# max_depth overrides the configured difficulty (hint searches the full game
+# without having to swap the global in and out); the depth-tagged TT keeps
+# entries from different horizons from contaminating each other.
+def minimax_score(board, current_player, max_depth=None):
+    if max_depth is None:
+        max_depth = MAX_GAME_DEPTH if AI_MAX_DEPTH is None else AI_MAX_DEPTH
+    depth_remaining = max_depth
+    if depth_remaining >= MAX_GAME_DEPTH:
+        entry = ORACLE.get((board << 1) | (current_player - 1))
+        if entry is not None:
+            return entry[0] if current_player == 1 else -entry[0]
+    score = negamax(board, current_player, depth_remaining, -INF, INF)
+    return score if current_player == 1 else -score
+
+# --- Perfect-play oracle ---------------------------------------------------
+# The reachable state space is tiny (cells only ever go up in rank, at most
+# 15 plies), so the whole game can be solved once and shipped as a lookup
+# table: key (board << 1) | side  ->  (value, best_move).  Build it with
+# `python trimatch.py --solve`; if the pickle is present it is loaded at
+# startup and full-depth searches become single dict probes.
+ORACLE = {}
+ORACLE_FILE = "trimatch_oracle.pkl"
+
+def _solve(board, player, oracle):
+    key = (board << 1) | (player - 1)
+    entry = oracle.get(key)
+    if entry is not None:
+        return entry[0]
+    outcome = check_outcome(board)
+    if outcome == 'win':
+        return -MAX_GAME_DEPTH
+    if outcome == 'loss':
+        return MAX_GAME_DEPTH
+    if outcome == 'draw':
+        return 0
+    best = -INF
     best_move = None
-    moves = get_possible_moves(board)
-    random.shuffle(moves)
-    for m in moves:
-        score = minimax_score(board_to_key(apply_move(board, m)), 2)
+    for child, m in gen_children(board):
+        score = -_solve(child, 3 - player, oracle)
+        score -= (score > 0) - (score < 0)
         if score > best:
             best = score
             best_move = m
-    return best_move
+    oracle[key] = (best, best_move)
+    return best
+
+def build_oracle():
+    oracle = {}
+    _solve(0, 1, oracle)
+    _solve(0, 2, oracle)
+    return oracle
+
+def load_oracle():
+    global ORACLE
+    try:
+        with open(ORACLE_FILE, 'rb') as f:
+            ORACLE = pickle.load(f)
+    except (OSError, pickle.PickleError):
+        ORACLE = {}
+
+# Choose the best move for AI (player 1).  Iterative deepening: the shallow
+# passes are cheap and leave TT best moves behind that order the deeper
+# passes for early cutoffs, so the total cost is dominated by the last pass.
+def get_best_move(board, history):
+    children = list(gen_children(board))
+    if not history:
+        return move_to_str(random.choice(children)[1])
+    random.shuffle(children)
+    max_depth = MAX_GAME_DEPTH if AI_MAX_DEPTH is None else AI_MAX_DEPTH
+    if max_depth >= MAX_GAME_DEPTH:
+        # at full depth the precomputed oracle already knows the answer
+        entry = ORACLE.get(board << 1)
+        if entry is not None:
+            return move_to_str(entry[1])
+    best_move = children[0][1]
+    for depth in range(1, max_depth + 1):
+        best = -INF
+        for child, m in children:
+            score = -negamax(child, 2, depth, -INF, -best + 1)
+            if score > best:
+                best = score
+                best_move = m
+        # bring this iteration's best move to the front for the next one
+        for i, (_, m) in enumerate(children):
+            if m == best_move:
+                children.insert(0, children.pop(i))
+                break
+        if best != 0:
+            # nonzero scores only arise from proven terminals, so the
+            # result cannot change at greater depth
+            break
+    return move_to_str(best_move)
 
 def level_up():
     global AI_LEVEL, AI_MAX_DEPTH
@@ -190,7 +392,8 @@ def main():
         if cmd == 'u':
             if current_player == 2 and game_over: # special case where only undo once
                 if undo_stack:
-                    board, history, current_player = undo_stack.pop()
+                    board, hist, current_player = undo_stack.pop()
+                    history = list(hist)
                     game_over = False
                     print("Last move undone; back to your turn.")
                 else:
@@ -199,7 +402,8 @@ def main():
                 # pop twice: AI move + your last move
                 if len(undo_stack) >= 2:
                     for _ in range(2):
-                        board, history, current_player = undo_stack.pop()
+                        board, hist, current_player = undo_stack.pop()
+                    history = list(hist)
                     game_over = False
                     print("Last two moves undone; back to your turn.")
                 else:
@@ -218,19 +422,14 @@ def main():
             if current_player != 2 or game_over:
                 print("Help is only available on your (Player 2’s) turn in an ongoing game.")
             else:
-                # temporarily disable depth limit
-                old_max = AI_MAX_DEPTH
-                AI_MAX_DEPTH = None
                 # Evaluate each legal human move by “what minimax would score it for the AI next turn”
                 suggestions = []
-                for m in get_possible_moves(board):
-                    next_key = board_to_key(apply_move(board, m))
-                    # After I move, it's AI's turn (player 1)
-                    score = minimax_score(next_key, 1)
-                    # score == 1 → AI wins, 0 → draw, -1 → AI loses
-                    suggestions.append((m.upper(), score))
-                # restore depth limit
-                AI_MAX_DEPTH = old_max
+                for child, m in gen_children(board):
+                    # After I move, it's AI's turn (player 1); search the
+                    # full game regardless of the configured difficulty
+                    score = minimax_score(child, 1, MAX_GAME_DEPTH)
+                    # score > 0 → AI wins, 0 → draw, < 0 → AI loses
+                    suggestions.append((move_to_str(m).upper(), score))
                 # Find the best outcome from human’s POV (minimize AI’s score)
                 best_score = min(s for _, s in suggestions)
                 best_moves = [mv for mv, s in suggestions if s == best_score]
@@ -274,9 +473,9 @@ Commands:
             piece_val = tile_map[cmd[0]]
             col = ord(cmd[1]) - ord('a')
             row = 3 - int(cmd[2])
-            target = board[row][col]
+            target = cell_value(board, row, col)
             # Validate move
-            if target is None:
+            if target == 0:
                 if count_tile(board, piece_val) >= 3:
                     print("Invalid move: no more of that tile available.")
                     continue
@@ -284,8 +483,8 @@ Commands:
                 if piece_val <= target or count_tile(board, piece_val) >= 3:
                     print("Invalid move: can only replace with a higher tile and within pool limits.")
                     continue
-            # Save for undo
-            undo_stack.append((copy.deepcopy(board), history.copy(), current_player))
+            # Save for undo: one int plus a history tuple, both immutable
+            undo_stack.append((board, tuple(history), current_player))
             board = apply_move(board, cmd)
             history.append((current_player, cmd))
             # Check outcome
@@ -320,4 +519,11 @@ Commands:
             print("Invalid input: enter a move like 'Mb2' or a command (q, n, n1, n2, m, h, u, d, d#, ?).")
 
 if __name__ == '__main__':
-    main()
+    if '--solve' in sys.argv:
+        ORACLE = build_oracle()
+        with open(ORACLE_FILE, 'wb') as f:
+            pickle.dump(ORACLE, f)
+        print(f"Solved {len(ORACLE)} positions -> {ORACLE_FILE}")
+    else:
+        load_oracle()
+        main()
@@ -1,9 +1,10 @@
 import pygame
 import sys
-import copy
+import pickle
 import random
 import math
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 
 # --- Game logic functions ---
@@ -16,101 +17,237 @@ HOTSEAT = False
 RANDOMNESS = True
 
 # Game state variables
-board = []
+# The board is packed into a single int, 2 bits per cell (0=empty, 1=N,
+# 2=K, 3=M); cell (r, c) lives at bit 2*(r*3+c).  Ints hash and compare
+# without allocation, so search nodes copy the board for free.
+board = 0
+piece_counts = [0, 0, 0, 0]  # on-board count per tile value (index 1..3)
 move_history = []
 undo_stack = []
 undo_used, hint_used = False, False
 current_player = 1
 game_over = False
 held_tile = None  # 'n','k','m'
-ai_move_timer = None
+# The AI search runs on a worker thread so the window keeps repainting
+# and handling events at high depths.  The search is submitted as soon as
+# it is the AI's turn; AI_DELAY below acts as a minimum display delay so
+# instant answers still read as the computer "thinking".  Undo and New
+# Game drop the pending future, so a result computed for an abandoned
+# position is never applied.
+ai_executor = ThreadPoolExecutor(max_workers=1)
+ai_future = None
+ai_submit_time = None
+# Bumped whenever a pending search is abandoned; the worker polls it so
+# an obsolete search stops early instead of occupying the single worker
+# while a fresh one queues behind it.
+ai_generation = 0
 
 # Initialize a new game state
 def new_game(start_player=1):
-    global board, move_history, undo_stack, undo_used, hint_used, current_player, game_over, held_tile, ai_move_timer
-    board = [[None]*3 for _ in range(3)]
+    global board, move_history, undo_stack, undo_used, hint_used, current_player, game_over, held_tile, ai_future, ai_generation
+    board = 0
+    piece_counts[:] = [0, 0, 0, 0]
     move_history = []
     undo_stack = []
     undo_used, hint_used = False, False
     current_player = start_player
     game_over = False
     held_tile = None
-    ai_move_timer = None
+    ai_generation += 1
+    ai_future = None   # abandon any in-flight search for the old game
+    killers.clear()
     log(f"New game started. Player {current_player} to move.")
     log(f"Current difficulty level is {AI_LEVEL}.")
 
+# Read one cell (0 means empty) out of a packed board
+def cell_value(bd, r, c):
+    return (bd >> (2 * (r * 3 + c))) & 3
+
+# Bit shifts of the three cells in each row, column and diagonal, and a
+# mask with the low bit of every cell set (a cell is occupied iff one of
+# its two bits is, so bd | bd >> 1 folded onto this mask tests fullness).
+LINE_SHIFTS = tuple(tuple(2 * cell for cell in line) for line in (
+    (0, 1, 2), (3, 4, 5), (6, 7, 8),    # rows
+    (0, 3, 6), (1, 4, 7), (2, 5, 8),    # columns
+    (0, 4, 8), (2, 4, 6),               # diagonals
+))
+CELL_LSB = 0b010101010101010101
+
+# A line's three cells form a 6-bit index into this 64-entry table,
+# classifying every possible line once at import time: 0 = neutral,
+# 1 = win (three equal nonzero), 2 = loss ({1,2,3} is the only cell
+# multiset whose product is 6).  bytes indexing is a C-speed lookup.
+def _classify_line(a, b, c):
+    if a == b == c != 0:
+        return 1
+    if a * b * c == 6:
+        return 2
+    return 0
+
+LINE_CLASS = bytes(_classify_line(i & 3, (i >> 2) & 3, i >> 4)
+                   for i in range(64))
+
 # Check for win, loss, or draw
-def check_outcome(board_state):
-    # Returns 'win', 'loss', 'draw', or None for ongoing games based on board_state.
-    all_lines = []
-    # Rows and columns
-    for idx in range(3):
-        all_lines.append(board_state[idx])  # row
-        all_lines.append([board_state[row][idx] for row in range(3)])  # col
-    # Diagonals
-    all_lines.append([board_state[i][i] for i in range(3)])
-    all_lines.append([board_state[i][2 - i] for i in range(3)])
-    # Loss: any 1-2-3 line
-    for line in all_lines:
-        if None not in line and set(line) == {1, 2, 3}:
-            return 'loss'
-    # Win: three identical
-    for line in all_lines:
-        if None not in line and line[0] == line[1] == line[2]:
-            return 'win'
+def check_outcome(bd):
+    # Returns 'win', 'loss', 'draw', or None for ongoing games based on bd.
+    win = False
+    for s0, s1, s2 in LINE_SHIFTS:
+        cls = LINE_CLASS[((bd >> s0) & 3) | (((bd >> s1) & 3) << 2)
+                         | (((bd >> s2) & 3) << 4)]
+        if cls:
+            # Loss outranks win, so report it as soon as any line shows one
+            if cls == 2:
+                return 'loss'
+            win = True
+    if win:
+        return 'win'
     # Draw: full board with no win/loss
-    if all(cell is not None for row in board_state for cell in row):
+    if (bd | bd >> 1) & CELL_LSB == CELL_LSB:
         return 'draw'
     return None
 
-# Count how many tiles of type on board
+# Split the packed board into one 9-bit occupancy bitmap per piece type
+# (bit i set iff cell i holds that piece): 1 = low bit only, 2 = high bit
+# only, 3 = both.
+def occupancies(bd):
+    lo = bd & CELL_LSB
+    hi = (bd >> 1) & CELL_LSB
+    return lo & ~hi, hi & ~lo, lo & hi
+
+# Count how many tiles of type on board: one POPCNT on the piece's bitmap
 def count_tile(bd, val):
-    return sum(cell == val for row in bd for cell in row)
-
-# Generate all legal moves
-def get_possible_moves(board_state):
-    # Returns a list of move strings (e.g. 'Nb2') valid from board_state.
-    legal_moves = []
-    for row_idx in range(3):
-        for col_idx in range(3):
-            existing_tile = board_state[row_idx][col_idx]
-            col_char = chr(ord('a') + col_idx)
-            row_char = str(3 - row_idx)
-            for piece_code, piece_value in tile_map.items():
-                on_board_count = count_tile(board_state, piece_value)
-                # Place on empty
-                if existing_tile is None and on_board_count < 3:
-                    legal_moves.append(f"{piece_code}{col_char}{row_char}")
-                # Upgrade lower tile
-                elif existing_tile is not None and piece_value > existing_tile and on_board_count < 3:
-                    legal_moves.append(f"{piece_code}{col_char}{row_char}")
-    return legal_moves
-    
-# Apply a move to the board in-place
-def apply_move_inplace(board_state, move_str):
-    # Executes move_str (e.g. 'Mb2') on board_state by modifying it.
-    piece_code, col_char, row_char = move_str
-    piece_value = tile_map[piece_code]
-    col_idx = ord(col_char) - ord('a')
-    row_idx = 3 - int(row_char)
-    board_state[row_idx][col_idx] = piece_value
-
-# Deep apply move, return new board
-def apply_move(bd, m):
-    newb = [row.copy() for row in bd]
-    apply_move_inplace(newb, m)
-    return newb
-
-# Key conversion
-def board_to_key(bd): return tuple(tuple(row) for row in bd)
-def key_to_board(k): return [list(row) for row in k]
+    return occupancies(bd)[val - 1].bit_count()
+
+# Moves are encoded as small ints, (cell << 2) | value; the string form
+# ('nb2') exists only at the UI boundary for the log and move history.
+# History entries add the mover above the move bits: (player << 6) | move.
+CELL_NAMES = tuple(f"{chr(ord('a') + cell % 3)}{3 - cell // 3}"
+                   for cell in range(9))
+
+def move_to_str(move):
+    return rev_map[move & 3].lower() + CELL_NAMES[move >> 2]
+
+# Generate all legal moves.  The move list is a pure function of the
+# board and the search revisits the same positions constantly, so cache
+# the tuples keyed on the packed int; entries never go stale.
+@lru_cache(maxsize=200_000)
+def legal_moves(bd):
+    # Returns a tuple of encoded moves valid from bd.
+    occ_n, occ_k, occ_m = occupancies(bd)
+    full = (False, occ_n.bit_count() >= 3, occ_k.bit_count() >= 3,
+            occ_m.bit_count() >= 3)
+    moves = []
+    for cell in range(9):
+        existing = (bd >> (2 * cell)) & 3
+        for val in (1, 2, 3):
+            # place on empty or upgrade a lower tile, pool permitting
+            if val > existing and not full[val]:
+                moves.append((cell << 2) | val)
+    return tuple(moves)
+
+# Apply an encoded move, returning the new packed board
+def apply_move(bd, move):
+    cell, val = move >> 2, move & 3
+    return (bd & ~(3 << (2 * cell))) | (val << (2 * cell))
+
+# Apply a move to the live game board, keeping the maintained pool
+# counts in sync
+def make_move(move):
+    global board
+    replaced = (board >> (2 * (move >> 2))) & 3
+    if replaced:
+        piece_counts[replaced] -= 1
+    piece_counts[move & 3] += 1
+    board = apply_move(board, move)
+
+# Rebuild the maintained counts after undo restores an older board
+def recount_pieces():
+    for val in (1, 2, 3):
+        piece_counts[val] = count_tile(board, val)
+
+# The board has the 8-fold dihedral symmetry of the square (4 rotations
+# x optional reflection), and symmetric positions have identical values.
+# SYM_MAPS[k][cell] is the cell whose contents land on `cell` under
+# symmetry k; SYM_INV[k] is the inverse permutation, used to carry moves
+# between a board and its canonical orientation.
+def _build_symmetries():
+    maps = []
+    for flip in (False, True):
+        for rot in range(4):
+            perm = []
+            for cell in range(9):
+                r, c = divmod(cell, 3)
+                if flip:
+                    c = 2 - c
+                for _ in range(rot):
+                    r, c = c, 2 - r
+                perm.append(r * 3 + c)
+            maps.append(tuple(perm))
+    return maps
+
+SYM_MAPS = _build_symmetries()
+SYM_INV = [tuple(perm.index(cell) for cell in range(9)) for perm in SYM_MAPS]
+
+def transform_board(bd, perm):
+    out = 0
+    for cell in range(9):
+        out |= ((bd >> (2 * perm[cell])) & 3) << (2 * cell)
+    return out
+
+@lru_cache(maxsize=65536)
+def canonical(bd):
+    # Returns (smallest symmetric variant of bd, index of the symmetry
+    # that produces it); all 8 variants share one TT entry via this key.
+    best, best_k = bd, 0
+    for k in range(1, 8):
+        variant = transform_board(bd, SYM_MAPS[k])
+        if variant < best:
+            best, best_k = variant, k
+    return best, best_k
+
+# Static move-ordering bonus per cell: the center sits on four lines,
+# corners on three, edges on two.
+CELL_BONUS = (1, 0, 1, 0, 2, 0, 1, 0, 1)
+
+# Killer moves: the last move that caused a cutoff at each depth, tried
+# first when that depth is searched again.  Reset per game.
+killers = {}
+
+def expand_children(bd, depth_remaining, hash_move=None):
+    # Build each child board exactly once and classify it while ordering,
+    # so the node loop never re-applies a move or re-tests a terminal.
+    # Likely cutoffs come first: immediate wins for the mover, then
+    # upgrades, higher-value pieces and busier cells.  The ranking is
+    # mover-relative (check_outcome's 'win' always favors whoever just
+    # moved), so MAX and MIN nodes share one ordering.
+    apply_, outcome_, bonus = apply_move, check_outcome, CELL_BONUS
+    items = []
+    for move in legal_moves(bd):
+        child = apply_(bd, move)
+        outcome = outcome_(child)
+        rank = 2 if outcome == 'win' else 0 if outcome == 'loss' else 1
+        cell = move >> 2
+        # plain tuples sort without a key function (ties fall through to
+        # the child ints, which are unique)
+        items.append(((rank, (bd >> (2 * cell)) & 3 != 0, move & 3,
+                       bonus[cell]), child, move, outcome))
+    items.sort(reverse=True)
+    ordered = [item[1:] for item in items]
+    # killer from this depth first, and the TT's remembered best move
+    # (the principal variation from a shallower pass) ahead of even that
+    for preferred in (killers.get(depth_remaining), hash_move):
+        if preferred is not None:
+            for i, item in enumerate(ordered):
+                if item[1] == preferred:
+                    ordered.insert(0, ordered.pop(i))
+                    break
+    return ordered
 
 # Evaluate terminal positions for minimax
 def evaluate_terminal(board_key, player):
-    # Converts board_key to a board, checks for win/loss/draw, and returns
-    # +1/-1/0 accordingly (None if non-terminal).
-    board_state = key_to_board(board_key)
-    outcome = check_outcome(board_state)
+    # Checks board_key for win/loss/draw and returns +1/-1/0 accordingly
+    # (None if non-terminal).
+    outcome = check_outcome(board_key)
     if outcome is None:
         return None
     last_player = 3 - player
@@ -120,61 +257,210 @@ def evaluate_terminal(board_key, player):
         return -1 if last_player == 1 else 1
     return 0  # draw, which should never happen
         
-# 5. Minimax scoring with caching
-@lru_cache(maxsize=None)
-def minimax_score(board_key, player, search_depth=0):
+# 5. Minimax scoring with a transposition table shared by AI moves and Hint.
+# Entries are keyed by (board_key, player) and store (depth_searched, flag,
+# value, best_move); a stored value answers any probe that needs at most
+# that depth, and the remembered best move seeds move ordering even when
+# the value itself is too shallow to reuse.  A full-depth Hint search
+# keeps accelerating later AI moves, and changing
+# the difficulty never invalidates the table.  The flag records whether the
+# value is exact or an alpha-beta bound (fail-soft), so entries stay
+# reusable under different search windows.  Values are from Player 1's
+# perspective and decay by one per ply below the node, which keeps them
+# independent of where the search was rooted.
+TT = {}
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+TT_FILE = "trimatch_tt.pkl"
+# Scores are bounded by +/-MAX_GAME_DEPTH, so a large int works as the
+# infinity sentinel and keeps comparisons on the interpreter's int path.
+INF = 10_000
+
+def load_tt():
+    global TT
+    try:
+        with open(TT_FILE, 'rb') as f:
+            TT = pickle.load(f)
+    except (OSError, pickle.PickleError):
+        TT = {}
+    # discard tables pickled by older key or entry formats
+    if TT and (not isinstance(next(iter(TT))[0], int)
+               or len(next(iter(TT.values()))) != 4):
+        TT = {}
+
+def save_tt():
+    try:
+        with open(TT_FILE, 'wb') as f:
+            pickle.dump(TT, f)
+    except OSError:
+        pass
+
+# Perfect-play oracle, shared with the console engine: `python trimatch.py
+# --solve` writes every reachable position's value and best move to
+# trimatch_oracle.pkl, keyed by (board << 1) | (player - 1) with the
+# mover's-perspective value and an (idx, val) move.  When the file is
+# present, full-depth AI moves and Hints become single dict probes;
+# without it everything falls back to the live search.
+ORACLE = {}
+ORACLE_FILE = "trimatch_oracle.pkl"
+
+def load_oracle():
+    global ORACLE
+    try:
+        with open(ORACLE_FILE, 'rb') as f:
+            ORACLE = pickle.load(f)
+    except (OSError, pickle.PickleError):
+        ORACLE = {}
+
+def minimax_score(board_key, player, depth_remaining, alpha, beta):
     """
     # Returns a minimax score for board_key when it's player's turn,
-    # using depth-limited search and caching.
+    # searching depth_remaining plies inside the (alpha, beta) window and
+    # caching through the TT.
     """
+    terminal_score = evaluate_terminal(board_key, player)
+    if terminal_score is not None:
+        return terminal_score * MAX_GAME_DEPTH
+
     # Depth cutoff
-    if AI_MAX_DEPTH is not None and search_depth >= AI_MAX_DEPTH:
+    if depth_remaining <= 0:
         return 0  # heuristic fallback
 
-    terminal_score = evaluate_terminal(board_key, player)
-    if terminal_score is not None:
-        return terminal_score * (MAX_GAME_DEPTH - search_depth)
+    # all 8 symmetric variants of a position share one TT entry
+    ckey, sym = canonical(board_key)
+    tt_key = (ckey, player)
+    entry = TT.get(tt_key)
+    hash_move = None
+    if entry is not None and entry[3] is not None:
+        # stored moves live in the canonical orientation; map back
+        hash_move = (SYM_MAPS[sym][entry[3] >> 2] << 2) | (entry[3] & 3)
+    if entry is not None and entry[0] >= depth_remaining:
+        _, flag, value, _ = entry
+        if flag == TT_EXACT:
+            return value
+        if flag == TT_LOWER:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return value
+    alpha_orig, beta_orig = alpha, beta
 
-    board_state = key_to_board(board_key)
-    legal_moves = get_possible_moves(board_state)
+    children = expand_children(board_key, depth_remaining, hash_move)
+    best_move = None
 
     if player == 1:
-        best_score = -float('inf')
-        for move in legal_moves:
-            next_key = board_to_key(apply_move(board_state, move))
-            child_score = minimax_score(next_key, 2, search_depth + 1)
+        best_score = -INF
+        for child, move, outcome in children:
+            if outcome is None:
+                # child windows are widened by one to absorb the per-ply decay
+                child_score = minimax_score(child, 2, depth_remaining - 1,
+                                            alpha - 1, beta + 1)
+                # decay toward zero so earlier wins/losses stay more extreme
+                child_score -= (child_score > 0) - (child_score < 0)
+            elif outcome == 'win':
+                # an immediate win is the best score any reply can reach
+                TT[tt_key] = (depth_remaining, TT_EXACT, MAX_GAME_DEPTH - 1,
+                              (SYM_INV[sym][move >> 2] << 2) | (move & 3))
+                return MAX_GAME_DEPTH - 1
+            else:
+                child_score = 0 if outcome == 'draw' else 1 - MAX_GAME_DEPTH
             if child_score > best_score:
                 best_score = child_score
-        return best_score
+                best_move = move
+            if best_score > alpha:
+                alpha = best_score
+            if alpha >= beta:
+                killers[depth_remaining] = move
+                break
+        if best_score >= beta:
+            flag = TT_LOWER
+        elif best_score <= alpha_orig:
+            flag = TT_UPPER
+        else:
+            flag = TT_EXACT
     else:
-        worst_score = float('inf')
-        for move in legal_moves:
-            next_key = board_to_key(apply_move(board_state, move))
-            child_score = minimax_score(next_key, 1, search_depth + 1)
-            if child_score < worst_score:
-                worst_score = child_score
-        return worst_score
+        best_score = INF
+        for child, move, outcome in children:
+            if outcome is None:
+                child_score = minimax_score(child, 1, depth_remaining - 1,
+                                            alpha - 1, beta + 1)
+                child_score -= (child_score > 0) - (child_score < 0)
+            elif outcome == 'win':
+                TT[tt_key] = (depth_remaining, TT_EXACT, 1 - MAX_GAME_DEPTH,
+                              (SYM_INV[sym][move >> 2] << 2) | (move & 3))
+                return 1 - MAX_GAME_DEPTH
+            else:
+                child_score = 0 if outcome == 'draw' else MAX_GAME_DEPTH - 1
+            if child_score < best_score:
+                best_score = child_score
+                best_move = move
+            if best_score < beta:
+                beta = best_score
+            if alpha >= beta:
+                killers[depth_remaining] = move
+                break
+        if best_score <= alpha:
+            flag = TT_UPPER
+        elif best_score >= beta_orig:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+    if best_move is not None:
+        best_move = (SYM_INV[sym][best_move >> 2] << 2) | (best_move & 3)
+    TT[tt_key] = (depth_remaining, flag, best_score, best_move)
+    return best_score
         
-# Choose best AI move
-def get_best_move(board_state):
-    moves = get_possible_moves(board_state)
+# Choose best AI move.  `generation` is the ai_generation value at
+# submit time: when the UI abandons the search, the mismatch makes the
+# deepening loop return early rather than finish a discarded search.
+def get_best_move(board_state, generation=None):
+    moves = list(legal_moves(board_state))
     # On the very first turn (empty move_history), optionally pick entirely at random
     if not move_history and RANDOMNESS:
         return random.choice(moves)
-    # Track the highest score seen so far and which move gave it
-    best_score = -float('inf')
-    best_move = None
     # If you want tie-break randomness, shuffle before evaluating
     if RANDOMNESS:
         random.shuffle(moves)
+    depth_budget = MAX_GAME_DEPTH if AI_MAX_DEPTH is None else AI_MAX_DEPTH
+    if depth_budget >= MAX_GAME_DEPTH:
+        # at full depth the precomputed oracle already knows the answer
+        entry = ORACLE.get(board_state << 1)
+        if entry is not None:
+            idx, val = entry[1]
+            return (idx << 2) | val
+    # symmetry pruning: equivalent replies have equal values, so keep one
+    # representative per equivalence class of resulting positions
+    seen = set()
+    unique = []
     for move in moves:
-        # Simulate making the move and score the resulting position
-        next_key = board_to_key(apply_move(board_state, move))
-        score = minimax_score(next_key, player=2, search_depth=0)
-        # If this move is better than any we’ve seen, remember it
-        if score > best_score:
-            best_score = score
-            best_move = move
+        ck = canonical(apply_move(board_state, move))[0]
+        if ck not in seen:
+            seen.add(ck)
+            unique.append(move)
+    moves = unique
+    best_move = moves[0]
+    # Iterative deepening: each shallow pass fills the TT and killer table
+    # so the next depth searches in near-optimal order, making the deep
+    # pass cheaper than a single direct call at the same depth.
+    for depth in range(1, depth_budget + 1):
+        best_score = -INF
+        for move in moves:
+            if generation is not None and generation != ai_generation:
+                return best_move  # abandoned; the result is discarded
+            # a move only matters if it beats the best one so far, so
+            # probe with best_score as the floor of the window
+            score = minimax_score(apply_move(board_state, move), 2, depth,
+                                  best_score, INF)
+            if score > best_score:
+                best_score = score
+                best_move = move
+        # try the previous iteration's choice first at the next depth
+        moves.remove(best_move)
+        moves.insert(0, best_move)
+        # scores decay toward zero from proven ends of game only, so a
+        # nonzero best is already exact; deeper passes cannot change it
+        if best_score != 0:
+            break
     return best_move
     
 # Level up
@@ -186,7 +472,6 @@ def level_up():
     if AI_LEVEL < 10:
         AI_LEVEL += 1
         AI_MAX_DEPTH = AI_LEVEL
-        minimax_score.cache_clear()
         log(f"You leveled up! AI depth now {AI_LEVEL}.", GREEN)
     else:
         log("You've beaten the highest level!", GREEN)
@@ -233,6 +518,28 @@ K_IMG = pygame.image.load("knight.png").convert_alpha()
 M_IMG = pygame.image.load("mystic.png").convert_alpha()
 pygame.display.set_icon(N_IMG)
 
+# Pre-rendered static text: Font.render is an expensive freetype call and
+# the cell labels and button captions never change.
+CELL_LABELS = list(CELL_NAMES)
+LABEL_SURFS = {txt: FONT.render(txt, True, BLACK) for txt in CELL_LABELS + BUTTONS}
+
+# Tile images are only ever drawn at two sizes (board/held 80, stacks 60);
+# smoothscale once instead of on every blit.
+SCALED_IMGS = {(val, size): pygame.transform.smoothscale(img, (size, size))
+               for val, img in ((1, N_IMG), (2, K_IMG), (3, M_IMG))
+               for size in (60, 80)}
+
+# Icon polygon vertex offsets per tile size: the knight triangle and the
+# mystic pentagon never change shape, only position, so do the trig once
+# instead of on every draw.
+TRIANGLE_OFFS = {size: ((0, -size//2), (-size//2, size//2), (size//2, size//2))
+                 for size in (60, 80)}
+PENTAGON_OFFS = {size: tuple(
+                     (int(size//2 * math.cos(i*72*math.pi/180 - math.pi/2)),
+                      int(size//2 * math.sin(i*72*math.pi/180 - math.pi/2)))
+                     for i in range(5))
+                 for size in (60, 80)}
+
 # Sounds
 pygame.mixer.init()
 pick_snd    = pygame.mixer.Sound("whoosh.ogg")
@@ -246,11 +553,20 @@ pick_snd.set_volume(0.5)
 log_offset = 0
 MAX_LOG = 50
 log_entries: list[tuple[str, tuple[int,int,int]]] = [] # store tuples of (message, pygame.Color)
+# The log panel is re-rendered only when a line is added or the view
+# scrolls; between changes draw_log just blits this cached surface.
+log_dirty = True
+log_surface = pygame.Surface((RIGHT_W, HEIGHT))
 
 def log(msg: str, color: tuple[int,int,int] = BLACK):
+    global log_dirty
     log_entries.append((msg, color))
+    log_dirty = True
 
+@lru_cache(maxsize=512)
 def wrap_text(text, font, max_width):
+    # pure function of its inputs, so memoized: FONT.size per word is an
+    # expensive freetype call to repeat on text that never changes
     words = text.split(' ')
     lines = []
     current = ""
@@ -265,7 +581,7 @@ def wrap_text(text, font, max_width):
             current = w
     if current:
         lines.append(current)
-    return lines
+    return tuple(lines)
 
 # Draw functions
 def draw_board():
@@ -279,12 +595,11 @@ def draw_board():
     # Labels
     for r in range(3):
         for c in range(3):
-            cell = f"{chr(ord('a')+c)}{3-r}"
-            WIN.blit(FONT.render(cell, True, BLACK), (BOARD_X+c*120+5, BOARD_Y+r*120+5))
+            WIN.blit(LABEL_SURFS[CELL_LABELS[r*3+c]], (BOARD_X+c*120+5, BOARD_Y+r*120+5))
     # Tiles
     for r in range(3):
         for c in range(3):
-            v = board[r][c]
+            v = cell_value(board, r, c)
             if v:
                 draw_tile_image(v, (BOARD_X+c*120+60, BOARD_Y+r*120+60), 80)
 
@@ -294,21 +609,17 @@ def draw_tile_icon(v, pos, size):
         pygame.draw.circle(WIN, GOLD, (x,y), size//2)
         pygame.draw.circle(WIN, BLACK, (x,y), size//2,2)
     elif v == 2:
-        pts = [(x,y-size//2), (x-size//2,y+size//2), (x+size//2,y+size//2)]
+        pts = [(x+dx, y+dy) for dx, dy in TRIANGLE_OFFS[size]]
         pygame.draw.polygon(WIN, SILVER, pts)
         pygame.draw.polygon(WIN, BLACK, pts,2)
     elif v == 3:
-        pts = []
-        for i in range(5):
-            ang = i*72*math.pi/180 - math.pi/2
-            pts.append((x+int(size//2*math.cos(ang)), y+int(size//2*math.sin(ang))))
+        pts = [(x+dx, y+dy) for dx, dy in PENTAGON_OFFS[size]]
         pygame.draw.polygon(WIN, SKY, pts)
         pygame.draw.polygon(WIN, BLACK, pts,2)
 
 def draw_tile_image(val, pos, size):
     draw_tile_icon (val, pos, size)
-    img = {1: N_IMG, 2: K_IMG, 3: M_IMG}[val]
-    img_sized = pygame.transform.smoothscale(img, (size, size))
+    img_sized = SCALED_IMGS[(val, size)]
     rect = img_sized.get_rect(center=pos)
     WIN.blit(img_sized, rect)
 
@@ -316,7 +627,7 @@ def draw_stacks():
     # Draw stacks with held tile removed temporarily
     for i, pc in enumerate(['n','k','m']):
         # base available = 3 minus on-board count
-        base = 3 - count_tile(board, tile_map[pc])
+        base = 3 - piece_counts[tile_map[pc]]
         # if this pc is held, temporarily remove one
         total = base - (1 if held_tile == pc else 0)
         for j in range(max(total, 0)):
@@ -329,20 +640,28 @@ def draw_buttons():
     for rect, txt in button_rects:
         pygame.draw.rect(WIN, OAK, rect)
         pygame.draw.rect(WIN, BLACK, rect,2)
-        WIN.blit(FONT.render(txt, True, BLACK), (rect.x+10, rect.y+10))
+        WIN.blit(LABEL_SURFS[txt], (rect.x+10, rect.y+10))
+
+# Rendered log lines: each distinct (text, color) is rendered once, not
+# on every frame it stays visible
+@lru_cache(maxsize=512)
+def render_log_line(text, color):
+    return FONT.render(text, True, color)
 
 def draw_log():
-    pygame.draw.rect(WIN, PARCHMENT, (RIGHT_X, 0, RIGHT_W, HEIGHT))
-    y = HEIGHT - 20
-    max_text_width = RIGHT_W - 20
-
-    # get the last MAX_LOG lines
-    for (raw_text, text_color) in reversed(log_entries[-MAX_LOG-log_offset : len(log_entries)-log_offset]):
-        # wrap it into sub-lines
-        for sub in reversed(wrap_text(raw_text, FONT, max_text_width)):
-            text_surf = FONT.render(sub, True, text_color)
-            WIN.blit(text_surf, (RIGHT_X + 10, y - 20))
-            y -= 20
+    global log_dirty
+    if log_dirty:
+        log_surface.fill(PARCHMENT)
+        y = HEIGHT - 20
+        max_text_width = RIGHT_W - 20
+        # get the last MAX_LOG lines
+        for (raw_text, text_color) in reversed(log_entries[-MAX_LOG-log_offset : len(log_entries)-log_offset]):
+            # wrap it into sub-lines
+            for sub in reversed(wrap_text(raw_text, FONT, max_text_width)):
+                log_surface.blit(render_log_line(sub, text_color), (10, y - 20))
+                y -= 20
+        log_dirty = False
+    WIN.blit(log_surface, (RIGHT_X, 0))
 
 def mouse_to_cell(mouse_x, mouse_y):
     if BOARD_X < mouse_x < BOARD_X+BOARD_SIZE and BOARD_Y < mouse_y < BOARD_Y+BOARD_SIZE:
@@ -351,36 +670,51 @@ def mouse_to_cell(mouse_x, mouse_y):
         return int(r), int(c)
     return None
 
-# Initialize game
+# Initialize game, warm-starting the TT from any previous session and
+# picking up the perfect-play table if it has been built
+load_tt()
+load_oracle()
 new_game(1)
 
 # Main loop
 running = True
+needs_redraw = True   # repaint only when something changed (dirty flag)
 while running:
-    WIN.fill((180,180,180))
-    pygame.draw.rect(WIN, WOOD, (0,0,LEFT_W,HEIGHT))
-    draw_buttons()
-    draw_board()
-    draw_stacks()
-    draw_log()
-    # draw held tile under cursor
-    if held_tile:
-        mouse_x,mouse_y = pygame.mouse.get_pos()
-        draw_tile_image(tile_map[held_tile], (mouse_x, mouse_y), 80)
+    if needs_redraw:
+        WIN.fill((180,180,180))
+        pygame.draw.rect(WIN, WOOD, (0,0,LEFT_W,HEIGHT))
+        draw_buttons()
+        draw_board()
+        draw_stacks()
+        draw_log()
+        # draw held tile under cursor
+        if held_tile:
+            mouse_x,mouse_y = pygame.mouse.get_pos()
+            draw_tile_image(tile_map[held_tile], (mouse_x, mouse_y), 80)
+        pygame.display.flip()
+        needs_redraw = False
 
     now = pygame.time.get_ticks()
-    # schedule AI move
-    if not HOTSEAT and not game_over and current_player == 1 and ai_move_timer is None:
-        ai_move_timer = now
-    # AI move after delay
-    if not HOTSEAT and not game_over and current_player == 1 and ai_move_timer and now - ai_move_timer >= AI_DELAY:
-        move = get_best_move(board)
-        ai_move_timer = None
-        undo_stack.append((copy.deepcopy(board), move_history.copy(), current_player))
-        apply_move_inplace(board, move)
-        move_history.append((1, move))
+    # kick the search off as soon as it's the AI's turn; the board is an
+    # immutable int, so the snapshot is the value itself
+    if not HOTSEAT and not game_over and current_player == 1 and ai_future is None:
+        ai_submit_time = now
+        ai_future = ai_executor.submit(get_best_move, board, ai_generation)
+    # apply the AI move once the search delivers it and the minimum
+    # display delay has passed; re-check that it is still the AI's turn
+    # so a result for an abandoned position is never applied
+    move = None
+    if (not HOTSEAT and not game_over and current_player == 1
+            and ai_future is not None and ai_future.done()
+            and now - ai_submit_time >= AI_DELAY):
+        move = ai_future.result()
+        ai_future = None
+    if move is not None:
+        undo_stack.append((board, len(move_history), current_player))
+        make_move(move)
+        move_history.append((1 << 6) | move)
         place_snd.play()
-        log(f"Computer played {move.upper()}")
+        log(f"Computer played {move_to_str(move).upper()}")
         res = check_outcome(board)
         if res == 'win':
             log("Computer wins! You lose!", BURGUNDY)
@@ -393,85 +727,121 @@ while running:
             win_snd.play()
         else:
             current_player = 2
+        needs_redraw = True
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
+        elif event.type == pygame.MOUSEMOTION:
+            # only the held-tile cursor preview animates between clicks
+            if held_tile:
+                needs_redraw = True
         elif event.type == pygame.MOUSEBUTTONDOWN:
+            needs_redraw = True
             mouse_x,mouse_y = event.pos
-            # button clicks
-            for rect, txt in button_rects:
-                if rect.collidepoint(mouse_x,mouse_y):
-                    button_snd.play()
-                    held_tile = None
-                    if txt == "New Game": new_game(1)
-                    elif txt == "Quit": running = False
-                    elif txt == "History": log(' | '.join(f"{i+1}.{mv.upper()}" for i,(pl,mv) in enumerate(move_history)))
-                    elif txt == "Undo":
-                        if HOTSEAT or (current_player == 2 and game_over): # special case where only undo once
-                            if undo_stack:
-                                board, move_history, current_player = undo_stack.pop()
-                                undo_used = True
-                                game_over = False
-                                log("Undid last move.")
-                            else:
-                                log("Nothing to undo.")
+            # button clicks: buttons form one fixed column (y = 20+i*50,
+            # h = 40), so hit-test by arithmetic instead of scanning the
+            # rect list
+
+            btn_idx, btn_off = divmod(mouse_y - 20, 50)
+            if (10 <= mouse_x < LEFT_W - 10 and btn_off < 40
+                    and 0 <= btn_idx < len(BUTTONS)):
+                txt = BUTTONS[btn_idx]
+                button_snd.play()
+                held_tile = None
+                if txt == "New Game": new_game(1)
+                elif txt == "Quit": running = False
+                elif txt == "History": log(' | '.join(f"{i+1}.{move_to_str(entry & 63).upper()}" for i, entry in enumerate(move_history)))
+                elif txt == "Undo":
+                    if HOTSEAT or (current_player == 2 and game_over): # special case where only undo once
+                        if undo_stack:
+                            # snapshots hold the packed board and how
+                            # long the history was; truncate back
+                            board, hist_len, current_player = undo_stack.pop()
+                            del move_history[hist_len:]
+                            recount_pieces()
+                            undo_used = True
+                            game_over = False
+                            ai_generation += 1  # stop the worker early
+                            ai_future = None  # discard any stale search
+                            log("Undid last move.")
                         else:
-                            if len(undo_stack) >= 2:
-                                for _ in range(2):
-                                    board, move_history, current_player = undo_stack.pop()
-                                undo_used = True
-                                game_over = False
-                                log("Undid last two moves.")
-                            else:
-                                log("Nothing to undo.")
-                        break
-                    elif txt == "Difficulty?":
-                        log(f"AI search depth is {AI_MAX_DEPTH}")
-                    elif txt == "Difficulty+":
-                        AI_MAX_DEPTH = min(MAX_GAME_DEPTH, AI_MAX_DEPTH+1)
-                        minimax_score.cache_clear()
-                        log(f"Depth now {AI_MAX_DEPTH}")
-                    elif txt == "Difficulty-":
-                        AI_MAX_DEPTH = max(1, AI_MAX_DEPTH-1)
-                        minimax_score.cache_clear()
-                        log(f"Depth now {AI_MAX_DEPTH}")
-                    elif txt == "Hotseat":
-                        HOTSEAT = not HOTSEAT
-                        mode = "Human vs Human" if HOTSEAT else "Human vs AI"
-                        log(f"Mode switched to: {mode}")
-                    elif txt == "Randomness":
-                        RANDOMNESS = not RANDOMNESS
-                        log("AI randomness is turned " + ("on." if RANDOMNESS else "off."))
-                    elif txt == "Hint":
-                        # Only on your turn, when the game is live
-                        if not HOTSEAT and (current_player != 2 or game_over):
-                            log("Hint only available on your turn in an ongoing game.")
+                            log("Nothing to undo.")
+                    else:
+                        if len(undo_stack) >= 2:
+                            for _ in range(2):
+                                board, hist_len, current_player = undo_stack.pop()
+                            del move_history[hist_len:]
+                            recount_pieces()
+                            undo_used = True
+                            game_over = False
+                            ai_generation += 1  # stop the worker early
+                            ai_future = None  # discard any stale search
+                            log("Undid last two moves.")
                         else:
-                            # Temporarily turn off depth limit
-                            old_max = AI_MAX_DEPTH
-                            AI_MAX_DEPTH = None
-                            # Evaluate each legal human move as if the AI were to play next
+                            log("Nothing to undo.")
+                elif txt == "Difficulty?":
+                    log(f"AI search depth is {AI_MAX_DEPTH}")
+                elif txt == "Difficulty+":
+                    # depth-tagged TT entries stay valid across changes
+                    AI_MAX_DEPTH = min(MAX_GAME_DEPTH, AI_MAX_DEPTH+1)
+                    log(f"Depth now {AI_MAX_DEPTH}")
+                elif txt == "Difficulty-":
+                    AI_MAX_DEPTH = max(1, AI_MAX_DEPTH-1)
+                    log(f"Depth now {AI_MAX_DEPTH}")
+                elif txt == "Hotseat":
+                    HOTSEAT = not HOTSEAT
+                    ai_generation += 1  # stop the worker early
+                    ai_future = None  # discard any stale search
+                    mode = "Human vs Human" if HOTSEAT else "Human vs AI"
+                    log(f"Mode switched to: {mode}")
+                elif txt == "Randomness":
+                    RANDOMNESS = not RANDOMNESS
+                    log("AI randomness is turned " + ("on." if RANDOMNESS else "off."))
+                elif txt == "Hint":
+                    # Only on your turn, when the game is live
+                    if not HOTSEAT and (current_player != 2 or game_over):
+                        log("Hint only available on your turn in an ongoing game.")
+                    else:
+                        # Evaluate each legal human move as if the AI
+                        # were to play next
+                        if ORACLE:
+                            # instant: probe the perfect-play table;
+                            # game-ending replies are scored directly
+                            # since the solver skips terminal keys
                             suggestions = []
-                            for move in get_possible_moves(board):
-                                score = minimax_score(board_to_key(apply_move(board, move)), 1, 0)
-                                suggestions.append((move.upper(), score))
-                            AI_MAX_DEPTH = old_max
-                            best_score = min(s for _, s in suggestions)
-                            best_moves = [mv for mv, s in suggestions if s == best_score]
-                            if best_score < 0:
-                                log("You can force a win with move(s): " + " ".join(best_moves))
-                            else:
-                                log("No matter what, opponent can force a win. Best you can do: " + " ".join(best_moves))
-                            hint_used = True
-
-                    elif txt == "Help":
-                        # A quick multi‐line tutorial in the log
-                        log("In TriMatch: Gold, Steel & Sorcery, you and your rival are the unseen hands of three competing powers—Nobles, Knights, and Mystics—each able to replace only a weaker influence with their own: gold yields to steel, steel to sorcery.")
-                        log("On your turn, you either place a tile on an empty district or 'upgrade' a lower-rank tile (returning it to the pool).")
-                        log("If you ever line up three of the same ranking in a row, column, or diagonal, you seize control of the city and win;")
-                        log("but if you create a line that contains exactly one Noble, one Knight, and one Mystic, their rivalries tear the city apart and you lose.")
-                    break
+                            for move in legal_moves(board):
+                                child = apply_move(board, move)
+                                entry = ORACLE.get(child << 1)
+                                score = (entry[0] if entry is not None
+                                         else evaluate_terminal(child, 1) * MAX_GAME_DEPTH)
+                                suggestions.append((move_to_str(move).upper(), score))
+                        else:
+                            # deepen so shallow passes seed the
+                            # ordering for the full one
+                            for depth in range(1, MAX_GAME_DEPTH + 1):
+                                suggestions = [
+                                    (move_to_str(move).upper(),
+                                     minimax_score(apply_move(board, move), 1, depth, -INF, INF))
+                                    for move in legal_moves(board)]
+                                # nonzero scores are proven outcomes, so
+                                # once every move has one, stop deepening
+                                if all(s for _, s in suggestions):
+                                    break
+                        best_score = min(s for _, s in suggestions)
+                        best_moves = [mv for mv, s in suggestions if s == best_score]
+                        if best_score < 0:
+                            log("You can force a win with move(s): " + " ".join(best_moves))
+                        else:
+                            log("No matter what, opponent can force a win. Best you can do: " + " ".join(best_moves))
+                        hint_used = True
+
+                elif txt == "Help":
+                    # A quick multi‐line tutorial in the log
+                    log("In TriMatch: Gold, Steel & Sorcery, you and your rival are the unseen hands of three competing powers—Nobles, Knights, and Mystics—each able to replace only a weaker influence with their own: gold yields to steel, steel to sorcery.")
+                    log("On your turn, you either place a tile on an empty district or 'upgrade' a lower-rank tile (returning it to the pool).")
+                    log("If you ever line up three of the same ranking in a row, column, or diagonal, you seize control of the city and win;")
+                    log("but if you create a line that contains exactly one Noble, one Knight, and one Mystic, their rivalries tear the city apart and you lose.")
             else:
                 # stack clicks
                 for i, pc in enumerate(['n','k','m']):
@@ -481,7 +851,7 @@ while running:
                     if x0 < mouse_x < x0+w and y0 < mouse_y < y0+h:
                         if not held_tile is None:
                             held_tile = None
-                        if count_tile(board, tile_map[pc]) < 3:
+                        if piece_counts[tile_map[pc]] < 3:
                             held_tile = pc
                             pick_snd.play()
                         break
@@ -492,13 +862,14 @@ while running:
                     cell = mouse_to_cell(mouse_x,mouse_y)
                     if held_tile and cell and not game_over and (HOTSEAT or current_player == 2):
                         r, c = cell
-                        target = board[r][c]
+                        target = cell_value(board, r, c)
                         val = tile_map[held_tile]
-                        if target is None or val > target:
-                            undo_stack.append((copy.deepcopy(board), move_history.copy(), current_player))
-                            move_str = f"{held_tile}{chr(ord('a')+c)}{3-r}"
-                            apply_move_inplace(board, move_str)
-                            move_history.append((current_player, move_str))
+                        if val > target:
+                            undo_stack.append((board, len(move_history), current_player))
+                            move = ((r * 3 + c) << 2) | val
+                            move_str = move_to_str(move)
+                            make_move(move)
+                            move_history.append((current_player << 6) | move)
                             place_snd.play()
                             log(f"You (P{current_player}) played {move_str.upper()}")
                             held_tile = None
@@ -514,10 +885,9 @@ while running:
                                 game_over = True
                                 lose_snd.play()
                             else:
+                                # the AI turn check at the top of the
+                                # loop submits the search on its own
                                 current_player = 3 - current_player
-                            if not HOTSEAT:
-                                # hand off to AI
-                                ai_move_timer = now
                         else:
                             log("Invalid move")
                     elif held_tile:
@@ -527,7 +897,23 @@ while running:
         elif event.type == pygame.MOUSEBUTTONUP:
             pass
 
-    pygame.display.flip()
-    clock.tick(60)
+    if needs_redraw or (not HOTSEAT and not game_over and current_player == 1):
+        # something changed, or an AI move is scheduled or in flight:
+        # keep ticking so the delay timer and the future get polled
+        clock.tick(60)
+    else:
+        # nothing animates and no AI work is pending; sleep until input
+        # arrives instead of spinning at 60 Hz, and re-post the waking
+        # event so the normal handler above processes it
+        event = pygame.event.wait(500)
+        if event.type != pygame.NOEVENT:
+            pygame.event.post(event)
+# Wait for any in-flight search before pickling: save_tt() iterating the
+# TT while the worker still inserts entries would raise "dictionary
+# changed size during iteration".  The generation bump makes the worker
+# bail out at the next root move, so the wait is short.
+ai_generation += 1
+ai_executor.shutdown(wait=True, cancel_futures=True)
+save_tt()
 pygame.quit()
 sys.exit()